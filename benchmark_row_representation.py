@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Row Representation Benchmark
+Compares dict rows (cursor(dictionary=True)) against tuple rows with a
+column index map, as used by migrate_to_supabase.py.
+
+Rows are synthetic attendance records shaped like the MySQL source table,
+so the benchmark runs without a database. Reports bytes per row held in
+memory and rows/sec through fetch + transform.
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+COLUMNS = ('id', 'school_id', 'staff_id', 'student_id', 'date', 'status',
+           'hours_worked', 'notes', 'created_at', 'updated_at')
+
+def generate_tuples(count):
+    """Yield attendance rows as the plain cursor returns them"""
+    base_date = date(2024, 1, 1)
+    base_time = datetime(2024, 1, 1, 9, 0, 0)
+    for i in range(count):
+        is_staff = i % 3 == 0
+        yield (
+            i + 1,
+            i % 20 + 1,
+            i % 50 + 1 if is_staff else None,
+            None if is_staff else i % 800 + 1,
+            base_date + timedelta(days=i % 365),
+            'present' if i % 7 else 'absent',
+            Decimal('8.00') if is_staff else None,
+            '',
+            base_time + timedelta(minutes=i),
+            base_time + timedelta(minutes=i),
+        )
+
+def fetch_dicts(count):
+    """Materialise rows the way cursor(dictionary=True) does"""
+    return [dict(zip(COLUMNS, row)) for row in generate_tuples(count)]
+
+def fetch_tuples(count):
+    """Materialise rows the way the plain cursor does"""
+    col = {name: index for index, name in enumerate(COLUMNS)}
+    return col, list(generate_tuples(count))
+
+def transform_dict(record):
+    return {
+        'school_id': record['school_id'],
+        'staff_id': record['staff_id'],
+        'student_id': record['student_id'],
+        'date': record['date'].isoformat() if record['date'] else None,
+        'status': record['status'],
+        'hours_worked': float(record['hours_worked']) if record['hours_worked'] else None,
+        'notes': record['notes'] if record['notes'] else '',
+        'created_at': record['created_at'].isoformat() if record['created_at'] else None,
+        'updated_at': record['updated_at'].isoformat() if record['updated_at'] else None,
+    }
+
+def transform_tuple(record, col):
+    return {
+        'school_id': record[col['school_id']],
+        'staff_id': record[col['staff_id']],
+        'student_id': record[col['student_id']],
+        'date': record[col['date']].isoformat() if record[col['date']] else None,
+        'status': record[col['status']],
+        'hours_worked': float(record[col['hours_worked']]) if record[col['hours_worked']] else None,
+        'notes': record[col['notes']] if record[col['notes']] else '',
+        'created_at': record[col['created_at']].isoformat() if record[col['created_at']] else None,
+        'updated_at': record[col['updated_at']].isoformat() if record[col['updated_at']] else None,
+    }
+
+def measure_bytes(fetch, count):
+    """Bytes allocated per row while the fetched result set is held"""
+    gc.collect()
+    tracemalloc.start()
+    rows = fetch(count)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+    return current / count
+
+def measure_dict_throughput(count):
+    start = time.perf_counter()
+    for record in fetch_dicts(count):
+        transform_dict(record)
+    return count / (time.perf_counter() - start)
+
+def measure_tuple_throughput(count):
+    start = time.perf_counter()
+    col, rows = fetch_tuples(count)
+    for record in rows:
+        transform_tuple(record, col)
+    return count / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000, help='rows per run (default: 200000)')
+    parser.add_argument('--repeat', type=int, default=3, help='throughput runs, best is kept (default: 3)')
+    args = parser.parse_args()
+
+    dict_bytes = measure_bytes(fetch_dicts, args.rows)
+    tuple_bytes = measure_bytes(fetch_tuples, args.rows)
+    dict_rate = max(measure_dict_throughput(args.rows) for _ in range(args.repeat))
+    tuple_rate = max(measure_tuple_throughput(args.rows) for _ in range(args.repeat))
+
+    print(f"Rows per run: {args.rows:,} (attendance shape, {len(COLUMNS)} columns)")
+    print(f"{'representation':<16}{'bytes/row':>12}{'rows/sec':>14}")
+    print(f"{'dict':<16}{dict_bytes:>12,.0f}{dict_rate:>14,.0f}")
+    print(f"{'tuple + index':<16}{tuple_bytes:>12,.0f}{tuple_rate:>14,.0f}")
+    print(f"\nMemory saved: {1 - tuple_bytes / dict_bytes:.0%}, speedup: {tuple_rate / dict_rate:.2f}x")
+
+if __name__ == '__main__':
+    main()
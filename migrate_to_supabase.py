@@ -6,10 +6,16 @@ This script migrates all data from the Django backend to Supabase.
 
 import mysql.connector
 from supabase import create_client, Client
+import argparse
+import gzip
+import httpx
 import json
 from datetime import datetime
+from itertools import islice
 import secrets
 import os
+import re
+import time
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -28,34 +34,137 @@ MYSQL_CONFIG = {
 SUPABASE_URL = os.getenv('SUPABASE_URL', 'https://rmvyespupcbdzwmwjekq.supabase.co')
 SUPABASE_SERVICE_KEY = os.getenv('SUPABASE_SERVICE_KEY', '')  # Service role key for admin operations
 
+# Page size when listing existing Supabase Auth users
+AUTH_LIST_PAGE_SIZE = 1000
+
+# Adaptive insert batching (AIMD per table): grow by BATCH_INCREASE rows after
+# each fast full batch, halve on slow round trips or capacity errors
+BATCH_INITIAL_SIZE = 50
+BATCH_INCREASE = 25
+BATCH_MAX_SIZE = 2000
+BATCH_TARGET_SECONDS = 2.0
+BATCH_MAX_BYTES = 2 * 1024 * 1024
+# Request bodies at least this large are sent gzip-compressed
+GZIP_MIN_BYTES = 16 * 1024
+# Responses that mean "send less / try again later". The request may still have
+# committed, so re-sends rely on the migration_key upsert to stay idempotent
+RETRY_STATUS_CODES = {408, 413, 429, 500, 502, 503, 504}
+BATCH_MAX_RETRIES = 5
+BATCH_RETRY_SECONDS = 1.0
+# Responses that reject rows of the batch; the batch is bisected to find them
+ROW_REJECT_STATUS_CODES = {400, 409, 422}
+# Error codes that mean the table itself can't take the rows (unknown table or
+# column, no unique constraint on migration_key); these abort the table
+SCHEMA_ERROR_CODES = {'PGRST204', 'PGRST205', '42P01', '42703', '42P10'}
+# Give up on a table once this many rows were rejected before any was inserted
+BATCH_ABORT_REJECTIONS = 20
+# Tables written through insert_rows(); each needs a unique migration_key column
+BATCHED_TABLES = ['schools', 'classrooms', 'students', 'staff', 'guard',
+                  'fee_records', 'salary_records', 'attendance', 'visitor']
+
 # Media files path
 MEDIA_ROOT = Path(__file__).parent / 'backend' / 'media'
 
-# Initialize clients
-print("Connecting to MySQL...")
-try:
-    mysql_conn = mysql.connector.connect(**MYSQL_CONFIG)
-    mysql_cursor = mysql_conn.cursor(dictionary=True)
-    print("✓ Connected to MySQL")
-except Exception as e:
-    print(f"✗ Failed to connect to MySQL: {e}")
-    exit(1)
-
-print("Connecting to Supabase...")
-try:
-    # Create Supabase client - simple initialization for migration script
-    supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
-    # Test connection by making a simple query
-    test_result = supabase.table('schools').select('id').limit(1).execute()
-    print("✓ Connected to Supabase")
-except Exception as e:
-    print(f"✗ Failed to connect to Supabase: {e}")
-    print(f"  URL: {SUPABASE_URL}")
-    print(f"  Service Key: {'Set' if SUPABASE_SERVICE_KEY else 'NOT SET (required!)'}")
-    if not SUPABASE_SERVICE_KEY:
-        print("\n  ⚠ Make sure you set SUPABASE_SERVICE_KEY in your .env file")
-        print("  Get it from: Supabase Dashboard → Settings → API → service_role key")
-    exit(1)
+# Clients, set by connect()
+mysql_conn = None
+mysql_cursor = None
+supabase: Client = None
+
+# Where mappings and temp passwords are written, set by run_migration()
+output_dir = Path('.')
+
+# Shared request budget, installed by migrate_batch.py (None means unthrottled)
+request_budget = None
+
+# Source being migrated, set by migrate_batch.py ('' for a single run). Generated
+# emails are namespaced by it, since every tenant numbers its schools from 1
+source_name = ''
+
+# Per-table batch sizing state, see insert_rows()
+batch_stats = {}
+
+# Whether large request bodies are gzipped: None until probed, False with --no-gzip
+gzip_requests = None
+
+def connect(mysql_config=MYSQL_CONFIG, supabase_url=SUPABASE_URL, supabase_service_key=SUPABASE_SERVICE_KEY):
+    """Open the MySQL and Supabase clients; returns False if either fails"""
+    global mysql_conn, mysql_cursor, supabase
+    
+    print("Connecting to MySQL...")
+    try:
+        mysql_conn = mysql.connector.connect(**mysql_config)
+        # Plain tuple rows: no per-row dict, columns are looked up through fetch_rows()
+        mysql_cursor = mysql_conn.cursor()
+        print("✓ Connected to MySQL")
+    except Exception as e:
+        print(f"✗ Failed to connect to MySQL: {e}")
+        return False
+    
+    print("Connecting to Supabase...")
+    try:
+        # Create Supabase client - simple initialization for migration script
+        supabase = create_client(supabase_url, supabase_service_key)
+        # Test connection by making a simple query
+        throttle()
+        supabase.table('schools').select('id').limit(1).execute()
+        print("✓ Connected to Supabase")
+    except Exception as e:
+        print(f"✗ Failed to connect to Supabase: {e}")
+        print(f"  URL: {supabase_url}")
+        print(f"  Service Key: {'Set' if supabase_service_key else 'NOT SET (required!)'}")
+        if not supabase_service_key:
+            print("\n  ⚠ Make sure you set SUPABASE_SERVICE_KEY in your .env file")
+            print("  Get it from: Supabase Dashboard → Settings → API → service_role key")
+        return False
+    
+    # Without migration_key every batched table would abort, and users would be
+    # created with no school or linked records; stop before any step runs
+    print("Checking target tables for migration_key...")
+    problems = check_migration_keys()
+    if problems:
+        for table, error in problems:
+            print(f"✗ {table}: {error}")
+        print("\n  ⚠ Add the migration_key columns before migrating")
+        print("  See MIGRATION_GUIDE.md → Step 4: Prepare the Target Tables")
+        return False
+    print("✓ Target tables ready")
+    
+    return True
+
+def check_migration_keys():
+    """Return [(table, error)] for batched tables that can't take a migration_key upsert
+
+    Selecting the column catches a missing column; an empty upsert on it
+    catches a missing unique constraint. Neither writes any rows.
+    """
+    problems = []
+    for table in BATCHED_TABLES:
+        try:
+            throttle()
+            supabase.table(table).select('migration_key').limit(0).execute()
+            throttle()
+            response = supabase.postgrest.session.post(
+                f"/{table}",
+                params={'on_conflict': 'migration_key'},
+                content=b'[]',
+                headers={'Content-Type': 'application/json', 'Prefer': 'return=minimal,resolution=merge-duplicates'},
+            )
+            if not response.is_success:
+                problems.append((table, _error_text(response)))
+        except Exception as e:
+            problems.append((table, str(e)))
+    return problems
+
+def close():
+    """Close the MySQL connection if one is open"""
+    if mysql_conn is not None:
+        mysql_conn.close()
+        print("\n✓ Database connections closed")
+
+def throttle():
+    """Wait for the shared request budget, if any, before a Supabase request"""
+    if request_budget is not None:
+        request_budget.acquire()
 
 # Mapping dictionaries
 mappings = {
@@ -67,11 +176,310 @@ mappings = {
     'users': {},
 }
 
+# Users not migrated because their own email already has an Auth account,
+# {username: reason}; filled by migrate_users()
+skipped_users = {}
+
+# Users whose resolved email was registered by someone else after the pre-pass,
+# {username: email}; filled by migrate_users()
+email_conflicts = {}
+
+# Step profiler, set by --profile (None keeps run_step a plain call)
+profiler = None
+
+def run_step(name, func, *args):
+    """Run one migration step, under the profiler when --profile is on"""
+    if profiler is None:
+        return func(*args)
+    return profiler.run(name, func, *args)
+
+class TableAborted(Exception):
+    """Raised inside insert_rows() when no row of a table can be inserted"""
+
+def migration_key(old_id):
+    """Stable key stored with each migrated row
+
+    Inserts upsert on it, so a batch re-sent after an ambiguous failure
+    can't duplicate rows, and returned rows are matched back to their
+    source rows through it.
+    """
+    return f"{source_name}:{old_id}" if source_name else str(old_id)
+
+def insert_rows(table, items):
+    """Insert (key, payload) pairs into a table in adaptively sized batches
+
+    Every payload carries a 'migration_key'. Yields (key, inserted_row, error)
+    per item; inserted rows hold 'id' and 'migration_key'. Batch size per
+    table starts at BATCH_INITIAL_SIZE, grows additively while round trips
+    stay under BATCH_TARGET_SECONDS and is halved on slow responses or
+    capacity errors, which are retried. It is also capped so request bodies
+    stay under BATCH_MAX_BYTES. Batches rejected for bad rows are bisected
+    to isolate them. Auth, missing-table and schema errors abort the table.
+    """
+    stats = batch_stats.setdefault(table, {
+        'size': BATCH_INITIAL_SIZE, 'peak': BATCH_INITIAL_SIZE, 'row_bytes': 0,
+        'requests': 0, 'seconds': 0.0, 'bytes_sent': 0, 'backoffs': 0,
+        'inserted': 0, 'rejected': 0,
+    })
+    items = iter(items)
+    
+    try:
+        while True:
+            limit = stats['size']
+            if stats['row_bytes']:
+                limit = max(1, min(limit, int(BATCH_MAX_BYTES // stats['row_bytes'])))
+            batch = list(islice(items, limit))
+            if not batch:
+                break
+            yield from _insert_batch(table, batch, stats)
+    except TableAborted as e:
+        print(f"  ✗ Aborting {table}: {e}")
+    
+    if stats['requests']:
+        print(f"  ↳ {table} batching: {stats['requests']} requests, final size {stats['size']} rows "
+              f"(peak {stats['peak']}), {stats['seconds'] / stats['requests']:.2f}s and "
+              f"{stats['bytes_sent'] / stats['requests'] / 1024:.1f} KB per request, {stats['backoffs']} backoffs")
+
+def _insert_batch(table, batch, stats, attempt=0):
+    body = json.dumps([payload for _, payload in batch], separators=(',', ':'), default=str).encode()
+    row_bytes = len(body) / len(batch)
+    stats['row_bytes'] = row_bytes if not stats['row_bytes'] else 0.8 * stats['row_bytes'] + 0.2 * row_bytes
+    
+    start = time.perf_counter()
+    try:
+        response = _post_rows(table, body, stats)
+    except httpx.TransportError as e:
+        yield from _retry_batch(table, batch, stats, attempt, f"{type(e).__name__}: {e}")
+        return
+    elapsed = time.perf_counter() - start
+    stats['seconds'] += elapsed
+    
+    if response.status_code in RETRY_STATUS_CODES:
+        yield from _retry_batch(table, batch, stats, attempt, f"HTTP {response.status_code}")
+        return
+    if response.status_code in ROW_REJECT_STATUS_CODES and _error_code(response) not in SCHEMA_ERROR_CODES:
+        yield from _reject_batch(table, batch, stats, response)
+        return
+    if not response.is_success:
+        raise TableAborted(f"HTTP {response.status_code}: {_error_text(response)}")
+    
+    if elapsed > BATCH_TARGET_SECONDS:
+        _shrink_batch(table, stats, len(batch), f"{elapsed:.1f}s round trip")
+    elif len(batch) >= stats['size']:
+        stats['size'] = min(BATCH_MAX_SIZE, stats['size'] + BATCH_INCREASE)
+        stats['peak'] = max(stats['peak'], stats['size'])
+    
+    # RETURNING order isn't guaranteed, so match rows back on migration_key
+    returned = {row['migration_key']: row for row in response.json()}
+    for key, payload in batch:
+        row = returned.get(payload['migration_key'])
+        if row:
+            stats['inserted'] += 1
+            yield key, row, None
+        else:
+            yield key, None, RuntimeError("row was not returned by the insert")
+
+def _retry_batch(table, batch, stats, attempt, reason):
+    """Back off after a capacity or transient failure and re-send the batch
+
+    The failed request may have committed before the error (a read timeout
+    or gateway 504), which is why rows are upserted on migration_key.
+    """
+    _shrink_batch(table, stats, len(batch), reason)
+    if attempt >= BATCH_MAX_RETRIES:
+        for key, _ in batch:
+            yield key, None, RuntimeError(f"gave up after {attempt + 1} attempts ({reason})")
+        return
+    time.sleep(BATCH_RETRY_SECONDS * 2 ** attempt)
+    size = stats['size']
+    for index in range(0, len(batch), size):
+        yield from _insert_batch(table, batch[index:index + size], stats, attempt + 1)
+
+def _reject_batch(table, batch, stats, response):
+    """Bisect a batch PostgREST rejected for its data, to isolate the bad rows"""
+    if len(batch) == 1:
+        stats['rejected'] += 1
+        if not stats['inserted'] and stats['rejected'] >= BATCH_ABORT_REJECTIONS:
+            raise TableAborted(f"the first {stats['rejected']} rows tried were all rejected, "
+                               f"last error: {_error_text(response)}")
+        yield batch[0][0], None, RuntimeError(_error_text(response))
+        return
+    middle = len(batch) // 2
+    yield from _insert_batch(table, batch[:middle], stats)
+    yield from _insert_batch(table, batch[middle:], stats)
+
+def _shrink_batch(table, stats, batch_len, reason):
+    """Multiplicative decrease, based on the batch that actually hit trouble"""
+    new_size = max(1, min(stats['size'], batch_len) // 2)
+    if new_size < stats['size']:
+        stats['size'] = new_size
+        stats['backoffs'] += 1
+        print(f"  ↳ {table}: batch size backed off to {new_size} rows ({reason})")
+
+def _error_code(response):
+    try:
+        return response.json().get('code')
+    except Exception:
+        return None
+
+def _error_text(response):
+    try:
+        error = response.json()
+        return f"{error.get('code')}: {error.get('message')} {error.get('details') or ''}".strip()
+    except Exception:
+        return response.text[:300]
+
+def _post_rows(table, body, stats):
+    """POST a JSON array to PostgREST as an upsert on migration_key"""
+    headers = {
+        'Content-Type': 'application/json',
+        'Prefer': 'return=representation,resolution=merge-duplicates',
+    }
+    params = {'on_conflict': 'migration_key', 'select': 'id,migration_key'}
+    content = body
+    if len(body) >= GZIP_MIN_BYTES and _gzip_supported(table):
+        content = gzip.compress(body, compresslevel=5)
+        headers['Content-Encoding'] = 'gzip'
+    
+    throttle()
+    response = supabase.postgrest.session.post(f"/{table}", params=params, content=content, headers=headers)
+    stats['requests'] += 1
+    stats['bytes_sent'] += len(content)
+    return response
+
+def _gzip_supported(table):
+    """Probe once per run whether the endpoint accepts gzip request bodies
+
+    The probe is a gzipped empty array, which inserts nothing, so the
+    answer doesn't depend on the rows of any batch.
+    """
+    global gzip_requests
+    if gzip_requests is None:
+        try:
+            throttle()
+            response = supabase.postgrest.session.post(
+                f"/{table}",
+                content=gzip.compress(b'[]'),
+                headers={'Content-Type': 'application/json', 'Content-Encoding': 'gzip', 'Prefer': 'return=minimal'},
+            )
+            gzip_requests = response.is_success
+        except httpx.HTTPError:
+            gzip_requests = False
+        if not gzip_requests:
+            print("  ⚠ Server does not accept gzip request bodies, sending them uncompressed")
+    return gzip_requests
+
+def fetch_rows(query):
+    """Run a query and return (column index map, tuple rows)
+
+    Rows stay as the tuples the connector produces; read a field with
+    row[col['name']] instead of building a dict per row.
+    """
+    mysql_cursor.execute(query)
+    rows = mysql_cursor.fetchall()
+    col = {desc[0]: index for index, desc in enumerate(mysql_cursor.description)}
+    return col, rows
+
 def generate_email_from_username(username, school_id=None):
     """Generate a unique email from username for Supabase Auth"""
+    domain = 'local'
+    if source_name:
+        domain = re.sub(r'[^a-z0-9-]+', '-', source_name.lower()).strip('-') + '.local'
     if school_id:
-        return f"{username}@school{school_id}.local"
-    return f"{username}@migrated.local"
+        return f"{username}@school{school_id}.{domain}"
+    return f"{username}@migrated.{domain}"
+
+def list_existing_auth_users():
+    """Return ({email: auth id}, {migration_key: auth id}) for all existing Supabase Auth users
+
+    Emails are lower-cased. Accounts created by migrate_users() carry their
+    migration_key in user_metadata, so a re-run recognises them.
+    """
+    emails = {}
+    migrated = {}
+    page = 1
+    try:
+        while True:
+            throttle()
+            auth_users = supabase.auth.admin.list_users(page=page, per_page=AUTH_LIST_PAGE_SIZE)
+            for auth_user in auth_users:
+                if auth_user.email:
+                    emails[auth_user.email.lower()] = auth_user.id
+                key = (auth_user.user_metadata or {}).get('migration_key')
+                if key:
+                    migrated[key] = auth_user.id
+            if len(auth_users) < AUTH_LIST_PAGE_SIZE:
+                break
+            page += 1
+    except Exception as e:
+        print(f"  ⚠ Could not list existing auth users, checking source emails only: {str(e)}")
+    return emails, migrated
+
+def resolve_user_emails(col, users, school_emails, existing_emails, migrated_keys=None):
+    """Pick a unique Supabase Auth email for every user before any account is created
+
+    Users whose migration_key is already in migrated_keys were created by an
+    earlier run, and users whose own email belongs to an existing Auth
+    account are not given a second identity; both are returned in
+    `existing` instead of `resolved`.
+
+    For the rest, candidates are tried in priority order: the user's own
+    email, the school's email for school_admins, then one generated from the
+    username. Users are visited in id order, so the lowest id keeps a shared
+    address and later users fall through to their next free candidate. If
+    every candidate is taken, the generated address gets a +{old id} suffix,
+    then a counter, until it's free. Emails compare case-insensitively.
+
+    Returns ({old_user_id: (email, source)}, [(username, wanted, email)],
+    {old_user_id: (email, auth_id, already_migrated)}).
+    """
+    migrated_keys = migrated_keys or {}
+    taken = set(existing_emails)
+    resolved = {}
+    collisions = []
+    existing = {}
+    
+    for user in users:
+        user_id = user[col['id']]
+        username = user[col['username']]
+        school_id = user[col['school_id']]
+        own_email = user[col['email']]
+        
+        key = migration_key(user_id)
+        if key in migrated_keys:
+            existing[user_id] = (own_email, migrated_keys[key], True)
+            continue
+        if own_email and own_email.lower() in existing_emails:
+            existing[user_id] = (own_email, existing_emails[own_email.lower()], False)
+            continue
+        
+        candidates = []
+        if own_email:
+            candidates.append((own_email, "user email"))
+        if user[col['role']] == 'school_admin' and school_id in school_emails:
+            candidates.append((school_emails[school_id], "school email"))
+        generated = generate_email_from_username(username, school_id)
+        candidates.append((generated, "generated"))
+        
+        email, source = next(
+            ((candidate, source) for candidate, source in candidates if candidate.lower() not in taken),
+            (None, None)
+        )
+        if email is None:
+            # Every candidate is taken: qualify the generated address with the old user id
+            local, domain = generated.split('@', 1)
+            email, source = f"{local}+{user_id}@{domain}", "generated, deduplicated"
+            suffix = 1
+            while email.lower() in taken:
+                suffix += 1
+                email = f"{local}+{user_id}-{suffix}@{domain}"
+        
+        if email != candidates[0][0]:
+            collisions.append((username, candidates[0][0], email))
+        taken.add(email.lower())
+        resolved[user_id] = (email, source)
+    
+    return resolved, collisions, existing
 
 def migrate_schools():
     """Migrate schools data"""
@@ -79,7 +487,7 @@ def migrate_schools():
     print("STEP 1: Migrating Schools...")
     print("="*50)
     
-    mysql_cursor.execute("""
+    col, schools = fetch_rows("""
         SELECT id, name, mobile, email, address, logo, 
                subscription_start, subscription_end, active,
                payment_amount, last_payment_date,
@@ -88,42 +496,46 @@ def migrate_schools():
         ORDER BY id
     """)
     
-    schools = mysql_cursor.fetchall()
     print(f"Found {len(schools)} schools to migrate")
     
-    for school in schools:
-        try:
-            # Handle logo path if it exists
-            logo_path = None
-            if school['logo']:
-                # Extract filename from path
-                logo_path = school['logo'].split('/')[-1] if '/' in str(school['logo']) else str(school['logo'])
-            
-            school_data = {
-                'name': school['name'],
-                'mobile': school['mobile'],
-                'email': school['email'] if school['email'] else None,
-                'address': school['address'] if school['address'] else None,
-                'logo': logo_path,
-                'subscription_start': school['subscription_start'].isoformat() if school['subscription_start'] else None,
-                'subscription_end': school['subscription_end'].isoformat() if school['subscription_end'] else None,
-                'active': bool(school['active']) if school['active'] is not None else False,
-                'payment_amount': str(school['payment_amount']) if school['payment_amount'] else None,
-                'last_payment_date': school['last_payment_date'].isoformat() if school['last_payment_date'] else None,
-                'created_at': school['created_at'].isoformat() if school['created_at'] else None,
-                'updated_at': school['updated_at'].isoformat() if school['updated_at'] else None,
-            }
-            
-            # Insert into Supabase
-            result = supabase.table('schools').insert(school_data).execute()
-            if result.data:
-                new_id = result.data[0]['id']
-                mappings['schools'][school['id']] = new_id
-                print(f"  ✓ Migrated school: {school['name']} (ID: {school['id']} -> {new_id})")
-            else:
-                print(f"  ✗ Failed to migrate school: {school['name']}")
-        except Exception as e:
-            print(f"  ✗ Error migrating school {school['name']}: {str(e)}")
+    def rows_to_insert():
+        for school in schools:
+            try:
+                # Handle logo path if it exists
+                logo_path = None
+                if school[col['logo']]:
+                    # Extract filename from path
+                    logo_path = school[col['logo']].split('/')[-1] if '/' in str(school[col['logo']]) else str(school[col['logo']])
+                
+                school_data = {
+                    'migration_key': migration_key(school[col['id']]),
+                    'name': school[col['name']],
+                    'mobile': school[col['mobile']],
+                    'email': school[col['email']] if school[col['email']] else None,
+                    'address': school[col['address']] if school[col['address']] else None,
+                    'logo': logo_path,
+                    'subscription_start': school[col['subscription_start']].isoformat() if school[col['subscription_start']] else None,
+                    'subscription_end': school[col['subscription_end']].isoformat() if school[col['subscription_end']] else None,
+                    'active': bool(school[col['active']]) if school[col['active']] is not None else False,
+                    'payment_amount': str(school[col['payment_amount']]) if school[col['payment_amount']] else None,
+                    'last_payment_date': school[col['last_payment_date']].isoformat() if school[col['last_payment_date']] else None,
+                    'created_at': school[col['created_at']].isoformat() if school[col['created_at']] else None,
+                    'updated_at': school[col['updated_at']].isoformat() if school[col['updated_at']] else None,
+                }
+                
+                yield school, school_data
+            except Exception as e:
+                print(f"  ✗ Error migrating school {school[col['name']]}: {str(e)}")
+    
+    for school, inserted, error in insert_rows('schools', rows_to_insert()):
+        if error:
+            print(f"  ✗ Error migrating school {school[col['name']]}: {str(error)}")
+        elif inserted:
+            new_id = inserted['id']
+            mappings['schools'][school[col['id']]] = new_id
+            print(f"  ✓ Migrated school: {school[col['name']]} (ID: {school[col['id']]} -> {new_id})")
+        else:
+            print(f"  ✗ Failed to migrate school: {school[col['name']]}")
     
     print(f"\n✓ Completed: {len(mappings['schools'])} schools migrated")
     return mappings['schools']
@@ -134,37 +546,42 @@ def migrate_classrooms(school_id_mapping):
     print("STEP 2: Migrating Classrooms...")
     print("="*50)
     
-    mysql_cursor.execute("""
+    col, classrooms = fetch_rows("""
         SELECT id, school_id, name, section, created_at, updated_at
         FROM classrooms
         ORDER BY id
     """)
     
-    classrooms = mysql_cursor.fetchall()
     print(f"Found {len(classrooms)} classrooms to migrate")
     
-    for classroom in classrooms:
-        try:
-            new_school_id = school_id_mapping.get(classroom['school_id'])
-            if not new_school_id:
-                print(f"  ⚠ Skipping classroom {classroom['name']}: school not found")
-                continue
-            
-            classroom_data = {
-                'school_id': new_school_id,
-                'name': classroom['name'],
-                'section': classroom['section'],
-                'created_at': classroom['created_at'].isoformat() if classroom['created_at'] else None,
-                'updated_at': classroom['updated_at'].isoformat() if classroom['updated_at'] else None,
-            }
-            
-            result = supabase.table('classrooms').insert(classroom_data).execute()
-            if result.data:
-                new_id = result.data[0]['id']
-                mappings['classrooms'][classroom['id']] = new_id
-                print(f"  ✓ Migrated classroom: {classroom['name']} - {classroom['section']} (ID: {classroom['id']} -> {new_id})")
-        except Exception as e:
-            print(f"  ✗ Error migrating classroom {classroom['name']}: {str(e)}")
+    def rows_to_insert():
+        for classroom in classrooms:
+            try:
+                new_school_id = school_id_mapping.get(classroom[col['school_id']])
+                if not new_school_id:
+                    print(f"  ⚠ Skipping classroom {classroom[col['name']]}: school not found")
+                    continue
+                
+                classroom_data = {
+                    'migration_key': migration_key(classroom[col['id']]),
+                    'school_id': new_school_id,
+                    'name': classroom[col['name']],
+                    'section': classroom[col['section']],
+                    'created_at': classroom[col['created_at']].isoformat() if classroom[col['created_at']] else None,
+                    'updated_at': classroom[col['updated_at']].isoformat() if classroom[col['updated_at']] else None,
+                }
+                
+                yield classroom, classroom_data
+            except Exception as e:
+                print(f"  ✗ Error migrating classroom {classroom[col['name']]}: {str(e)}")
+    
+    for classroom, inserted, error in insert_rows('classrooms', rows_to_insert()):
+        if error:
+            print(f"  ✗ Error migrating classroom {classroom[col['name']]}: {str(error)}")
+        elif inserted:
+            new_id = inserted['id']
+            mappings['classrooms'][classroom[col['id']]] = new_id
+            print(f"  ✓ Migrated classroom: {classroom[col['name']]} - {classroom[col['section']]} (ID: {classroom[col['id']]} -> {new_id})")
     
     print(f"\n✓ Completed: {len(mappings['classrooms'])} classrooms migrated")
     return mappings['classrooms']
@@ -175,7 +592,7 @@ def migrate_students(school_id_mapping, classroom_id_mapping):
     print("STEP 3: Migrating Students...")
     print("="*50)
     
-    mysql_cursor.execute("""
+    col, students = fetch_rows("""
         SELECT id, school_id, classroom_id, admission_no, roll_number,
                first_name, last_name, dob, gender, mobile, address,
                parent_guardian_name, parent_guardian_contact,
@@ -185,45 +602,50 @@ def migrate_students(school_id_mapping, classroom_id_mapping):
         ORDER BY id
     """)
     
-    students = mysql_cursor.fetchall()
     print(f"Found {len(students)} students to migrate")
     
-    for student in students:
-        try:
-            new_school_id = school_id_mapping.get(student['school_id'])
-            if not new_school_id:
-                print(f"  ⚠ Skipping student {student['first_name']}: school not found")
-                continue
-            
-            new_classroom_id = classroom_id_mapping.get(student['classroom_id']) if student['classroom_id'] else None
-            
-            student_data = {
-                'school_id': new_school_id,
-                'classroom_id': new_classroom_id,
-                'admission_no': student['admission_no'] if student['admission_no'] else None,
-                'roll_number': student['roll_number'] if student['roll_number'] else None,
-                'first_name': student['first_name'],
-                'last_name': student['last_name'],
-                'dob': student['dob'].isoformat() if student['dob'] else None,
-                'gender': student['gender'],
-                'mobile': student['mobile'],
-                'address': student['address'],
-                'parent_guardian_name': student['parent_guardian_name'],
-                'parent_guardian_contact': student['parent_guardian_contact'],
-                'enrollment_status': student['enrollment_status'] if student['enrollment_status'] else 'active',
-                'total_amount': str(student['total_amount']) if student['total_amount'] else None,
-                'profile_picture': student['profile_picture'],  # Will handle file upload separately
-                'created_at': student['created_at'].isoformat() if student['created_at'] else None,
-                'updated_at': student['updated_at'].isoformat() if student['updated_at'] else None,
-            }
-            
-            result = supabase.table('students').insert(student_data).execute()
-            if result.data:
-                new_id = result.data[0]['id']
-                mappings['students'][student['id']] = new_id
-                print(f"  ✓ Migrated student: {student['first_name']} {student['last_name']} (ID: {student['id']} -> {new_id})")
-        except Exception as e:
-            print(f"  ✗ Error migrating student {student.get('first_name', 'Unknown')}: {str(e)}")
+    def rows_to_insert():
+        for student in students:
+            try:
+                new_school_id = school_id_mapping.get(student[col['school_id']])
+                if not new_school_id:
+                    print(f"  ⚠ Skipping student {student[col['first_name']]}: school not found")
+                    continue
+                
+                new_classroom_id = classroom_id_mapping.get(student[col['classroom_id']]) if student[col['classroom_id']] else None
+                
+                student_data = {
+                    'migration_key': migration_key(student[col['id']]),
+                    'school_id': new_school_id,
+                    'classroom_id': new_classroom_id,
+                    'admission_no': student[col['admission_no']] if student[col['admission_no']] else None,
+                    'roll_number': student[col['roll_number']] if student[col['roll_number']] else None,
+                    'first_name': student[col['first_name']],
+                    'last_name': student[col['last_name']],
+                    'dob': student[col['dob']].isoformat() if student[col['dob']] else None,
+                    'gender': student[col['gender']],
+                    'mobile': student[col['mobile']],
+                    'address': student[col['address']],
+                    'parent_guardian_name': student[col['parent_guardian_name']],
+                    'parent_guardian_contact': student[col['parent_guardian_contact']],
+                    'enrollment_status': student[col['enrollment_status']] if student[col['enrollment_status']] else 'active',
+                    'total_amount': str(student[col['total_amount']]) if student[col['total_amount']] else None,
+                    'profile_picture': student[col['profile_picture']],  # Will handle file upload separately
+                    'created_at': student[col['created_at']].isoformat() if student[col['created_at']] else None,
+                    'updated_at': student[col['updated_at']].isoformat() if student[col['updated_at']] else None,
+                }
+                
+                yield student, student_data
+            except Exception as e:
+                print(f"  ✗ Error migrating student {student[col['first_name']]}: {str(e)}")
+    
+    for student, inserted, error in insert_rows('students', rows_to_insert()):
+        if error:
+            print(f"  ✗ Error migrating student {student[col['first_name']]}: {str(error)}")
+        elif inserted:
+            new_id = inserted['id']
+            mappings['students'][student[col['id']]] = new_id
+            print(f"  ✓ Migrated student: {student[col['first_name']]} {student[col['last_name']]} (ID: {student[col['id']]} -> {new_id})")
     
     print(f"\n✓ Completed: {len(mappings['students'])} students migrated")
     return mappings['students']
@@ -234,7 +656,7 @@ def migrate_staff(school_id_mapping):
     print("STEP 4: Migrating Staff...")
     print("="*50)
     
-    mysql_cursor.execute("""
+    col, staff_list = fetch_rows("""
         SELECT id, school_id, name, designation, qualifications, mobile,
                joining_date, employment_status, monthly_salary, total_amount,
                profile_picture, bank_account_no, bank_name, ifsc_code,
@@ -243,41 +665,46 @@ def migrate_staff(school_id_mapping):
         ORDER BY id
     """)
     
-    staff_list = mysql_cursor.fetchall()
     print(f"Found {len(staff_list)} staff members to migrate")
     
-    for staff in staff_list:
-        try:
-            new_school_id = school_id_mapping.get(staff['school_id'])
-            if not new_school_id:
-                print(f"  ⚠ Skipping staff {staff['name']}: school not found")
-                continue
-            
-            staff_data = {
-                'school_id': new_school_id,
-                'name': staff['name'],
-                'designation': staff['designation'],
-                'qualifications': staff['qualifications'],
-                'mobile': staff['mobile'],
-                'joining_date': staff['joining_date'].isoformat() if staff['joining_date'] else None,
-                'employment_status': staff['employment_status'] if staff['employment_status'] else 'active',
-                'monthly_salary': str(staff['monthly_salary']) if staff['monthly_salary'] else None,
-                'total_amount': str(staff['total_amount']) if staff['total_amount'] else None,
-                'profile_picture': staff['profile_picture'],
-                'bank_account_no': staff['bank_account_no'] if staff['bank_account_no'] else '',
-                'bank_name': staff['bank_name'] if staff['bank_name'] else '',
-                'ifsc_code': staff['ifsc_code'] if staff['ifsc_code'] else '',
-                'created_at': staff['created_at'].isoformat() if staff['created_at'] else None,
-                'updated_at': staff['updated_at'].isoformat() if staff['updated_at'] else None,
-            }
-            
-            result = supabase.table('staff').insert(staff_data).execute()
-            if result.data:
-                new_id = result.data[0]['id']
-                mappings['staff'][staff['id']] = new_id
-                print(f"  ✓ Migrated staff: {staff['name']} (ID: {staff['id']} -> {new_id})")
-        except Exception as e:
-            print(f"  ✗ Error migrating staff {staff.get('name', 'Unknown')}: {str(e)}")
+    def rows_to_insert():
+        for staff in staff_list:
+            try:
+                new_school_id = school_id_mapping.get(staff[col['school_id']])
+                if not new_school_id:
+                    print(f"  ⚠ Skipping staff {staff[col['name']]}: school not found")
+                    continue
+                
+                staff_data = {
+                    'migration_key': migration_key(staff[col['id']]),
+                    'school_id': new_school_id,
+                    'name': staff[col['name']],
+                    'designation': staff[col['designation']],
+                    'qualifications': staff[col['qualifications']],
+                    'mobile': staff[col['mobile']],
+                    'joining_date': staff[col['joining_date']].isoformat() if staff[col['joining_date']] else None,
+                    'employment_status': staff[col['employment_status']] if staff[col['employment_status']] else 'active',
+                    'monthly_salary': str(staff[col['monthly_salary']]) if staff[col['monthly_salary']] else None,
+                    'total_amount': str(staff[col['total_amount']]) if staff[col['total_amount']] else None,
+                    'profile_picture': staff[col['profile_picture']],
+                    'bank_account_no': staff[col['bank_account_no']] if staff[col['bank_account_no']] else '',
+                    'bank_name': staff[col['bank_name']] if staff[col['bank_name']] else '',
+                    'ifsc_code': staff[col['ifsc_code']] if staff[col['ifsc_code']] else '',
+                    'created_at': staff[col['created_at']].isoformat() if staff[col['created_at']] else None,
+                    'updated_at': staff[col['updated_at']].isoformat() if staff[col['updated_at']] else None,
+                }
+                
+                yield staff, staff_data
+            except Exception as e:
+                print(f"  ✗ Error migrating staff {staff[col['name']]}: {str(e)}")
+    
+    for staff, inserted, error in insert_rows('staff', rows_to_insert()):
+        if error:
+            print(f"  ✗ Error migrating staff {staff[col['name']]}: {str(error)}")
+        elif inserted:
+            new_id = inserted['id']
+            mappings['staff'][staff[col['id']]] = new_id
+            print(f"  ✓ Migrated staff: {staff[col['name']]} (ID: {staff[col['id']]} -> {new_id})")
     
     print(f"\n✓ Completed: {len(mappings['staff'])} staff members migrated")
     return mappings['staff']
@@ -288,41 +715,47 @@ def migrate_guards(school_id_mapping):
     print("STEP 5: Migrating Guards...")
     print("="*50)
     
-    mysql_cursor.execute("""
+    col, guards = fetch_rows("""
         SELECT id, school_id, name, mobile, shift, employee_id, profile_picture,
                created_at, updated_at
         FROM guard
         ORDER BY id
     """)
     
-    guards = mysql_cursor.fetchall()
     print(f"Found {len(guards)} guards to migrate")
     
     guard_mapping = {}
-    for guard in guards:
-        try:
-            new_school_id = school_id_mapping.get(guard['school_id'])
-            if not new_school_id:
-                continue
-            
-            guard_data = {
-                'school_id': new_school_id,
-                'name': guard['name'],
-                'mobile': guard['mobile'] if guard['mobile'] else '',
-                'shift': guard['shift'] if guard['shift'] else '',
-                'employee_id': guard['employee_id'] if guard['employee_id'] else None,
-                'profile_picture': guard['profile_picture'],
-                'created_at': guard['created_at'].isoformat() if guard['created_at'] else None,
-                'updated_at': guard['updated_at'].isoformat() if guard['updated_at'] else None,
-            }
-            
-            result = supabase.table('guard').insert(guard_data).execute()
-            if result.data:
-                new_id = result.data[0]['id']
-                guard_mapping[guard['id']] = new_id
-                print(f"  ✓ Migrated guard: {guard['name']} (ID: {guard['id']} -> {new_id})")
-        except Exception as e:
-            print(f"  ✗ Error migrating guard {guard.get('name', 'Unknown')}: {str(e)}")
+    
+    def rows_to_insert():
+        for guard in guards:
+            try:
+                new_school_id = school_id_mapping.get(guard[col['school_id']])
+                if not new_school_id:
+                    continue
+                
+                guard_data = {
+                    'migration_key': migration_key(guard[col['id']]),
+                    'school_id': new_school_id,
+                    'name': guard[col['name']],
+                    'mobile': guard[col['mobile']] if guard[col['mobile']] else '',
+                    'shift': guard[col['shift']] if guard[col['shift']] else '',
+                    'employee_id': guard[col['employee_id']] if guard[col['employee_id']] else None,
+                    'profile_picture': guard[col['profile_picture']],
+                    'created_at': guard[col['created_at']].isoformat() if guard[col['created_at']] else None,
+                    'updated_at': guard[col['updated_at']].isoformat() if guard[col['updated_at']] else None,
+                }
+                
+                yield guard, guard_data
+            except Exception as e:
+                print(f"  ✗ Error migrating guard {guard[col['name']]}: {str(e)}")
+    
+    for guard, inserted, error in insert_rows('guard', rows_to_insert()):
+        if error:
+            print(f"  ✗ Error migrating guard {guard[col['name']]}: {str(error)}")
+        elif inserted:
+            new_id = inserted['id']
+            guard_mapping[guard[col['id']]] = new_id
+            print(f"  ✓ Migrated guard: {guard[col['name']]} (ID: {guard[col['id']]} -> {new_id})")
     
     print(f"\n✓ Completed: {len(guard_mapping)} guards migrated")
     return guard_mapping
@@ -334,12 +767,12 @@ def migrate_users(school_id_mapping, staff_id_mapping, student_id_mapping, guard
     print("="*50)
     
     # First, get all schools with their emails for school_admin users
-    mysql_cursor.execute("""
+    scol, schools = fetch_rows("""
         SELECT id, email FROM schools WHERE email IS NOT NULL AND email != ''
     """)
-    school_emails = {row['id']: row['email'] for row in mysql_cursor.fetchall()}
+    school_emails = {school[scol['id']]: school[scol['email']] for school in schools}
     
-    mysql_cursor.execute("""
+    col, users = fetch_rows("""
         SELECT id, username, password, email, first_name, last_name,
                is_superuser, is_active, date_joined, last_login,
                school_id, role, linked_staff_id, linked_student_id, linked_guard_id
@@ -347,59 +780,70 @@ def migrate_users(school_id_mapping, staff_id_mapping, student_id_mapping, guard
         ORDER BY id
     """)
     
-    users = mysql_cursor.fetchall()
     print(f"Found {len(users)} users to migrate")
     print("\n⚠ NOTE: Passwords cannot be migrated directly.")
     print("   Users will need to reset their passwords after migration.")
     print("   Temporary passwords will be generated.\n")
     
+    # Resolve every email before creating any account, so collisions cost no failed calls
+    existing_emails, migrated_keys = list_existing_auth_users()
+    print(f"Found {len(existing_emails)} existing Supabase Auth accounts")
+    resolved_emails, collisions, existing_users = resolve_user_emails(
+        col, users, school_emails, existing_emails, migrated_keys)
+    if collisions:
+        print(f"⚠ Resolved {len(collisions)} email collisions before account creation:")
+        for username, wanted, email in collisions:
+            print(f"    {username}: {wanted} is taken, using {email}")
+    print()
+    
     temp_passwords = {}
     
     for user in users:
+        if user[col['id']] in existing_users:
+            email, auth_id, already_migrated = existing_users[user[col['id']]]
+            if already_migrated:
+                # Created by an earlier run of this migration; keep its account
+                mappings['users'][user[col['id']]] = auth_id
+                print(f"  ✓ Already migrated: {user[col['username']]} (ID: {user[col['id']]} -> UUID: {auth_id[:8]}...)")
+            else:
+                # Not ours to link or duplicate; left for an admin to resolve
+                skipped_users[user[col['username']]] = f"{email} already exists in Auth"
+                print(f"  ⚠ Skipped user {user[col['username']]}: {email} already belongs to an existing Auth account")
+            continue
+        
         try:
-            # Determine email for Supabase Auth
-            email = None
-            
-            # Priority 1: User's own email
-            if user['email']:
-                email = user['email']
-            # Priority 2: For school_admin, use school's email
-            elif user['role'] == 'school_admin' and user['school_id']:
-                email = school_emails.get(user['school_id'])
-            # Priority 3: Generate from username
-            if not email:
-                email = generate_email_from_username(
-                    user['username'], 
-                    user['school_id']
-                )
+            # Email for Supabase Auth, resolved and deduplicated up front
+            email, email_source = resolved_emails[user[col['id']]]
             
             # Map school_id
-            new_school_id = school_id_mapping.get(user['school_id']) if user['school_id'] else None
+            new_school_id = school_id_mapping.get(user[col['school_id']]) if user[col['school_id']] else None
             
             # Map linked IDs
-            new_linked_staff_id = staff_id_mapping.get(user['linked_staff_id']) if user['linked_staff_id'] else None
-            new_linked_student_id = student_id_mapping.get(user['linked_student_id']) if user['linked_student_id'] else None
-            new_linked_guard_id = guard_id_mapping.get(user['linked_guard_id']) if user['linked_guard_id'] else None
+            new_linked_staff_id = staff_id_mapping.get(user[col['linked_staff_id']]) if user[col['linked_staff_id']] else None
+            new_linked_student_id = student_id_mapping.get(user[col['linked_student_id']]) if user[col['linked_student_id']] else None
+            new_linked_guard_id = guard_id_mapping.get(user[col['linked_guard_id']]) if user[col['linked_guard_id']] else None
             
             # Generate temporary password
             temp_password = secrets.token_urlsafe(12)
-            temp_passwords[user['username']] = temp_password
+            temp_passwords[user[col['username']]] = temp_password
             
             # Create Supabase Auth user
             try:
+                throttle()
                 auth_response = supabase.auth.admin.create_user({
                     "email": email,
                     "password": temp_password,
                     "email_confirm": True,
                     "user_metadata": {
-                        "username": user['username'],
+                        "username": user[col['username']],
                         "migrated_from_django": True,
-                        "old_user_id": user['id']
+                        "old_user_id": user[col['id']],
+                        "migration_key": migration_key(user[col['id']]),
                     }
                 })
                 
                 if not auth_response.user:
-                    print(f"  ✗ Failed to create auth user for {user['username']}")
+                    print(f"  ✗ Failed to create auth user for {user[col['username']]}")
                     continue
                 
                 new_user_id = auth_response.user.id
@@ -407,44 +851,54 @@ def migrate_users(school_id_mapping, staff_id_mapping, student_id_mapping, guard
                 # Create user record in public.users table
                 user_data = {
                     'id': new_user_id,  # Use auth user's UUID
-                    'username': user['username'],
+                    'username': user[col['username']],
                     'school_id': new_school_id,
-                    'role': user['role'] if user['role'] else 'school_admin',
+                    'role': user[col['role']] if user[col['role']] else 'school_admin',
                     'linked_staff_id': new_linked_staff_id,
                     'linked_student_id': new_linked_student_id,
                     'linked_guard_id': new_linked_guard_id,
-                    'created_at': user['date_joined'].isoformat() if user['date_joined'] else None,
+                    'created_at': user[col['date_joined']].isoformat() if user[col['date_joined']] else None,
                 }
                 
+                throttle()
                 result = supabase.table('users').insert(user_data).execute()
                 
                 if result.data:
-                    mappings['users'][user['id']] = new_user_id
-                    email_source = "user email" if user['email'] else ("school email" if user['role'] == 'school_admin' and user['school_id'] in school_emails else "generated")
-                    print(f"  ✓ Migrated user: {user['username']} (ID: {user['id']} -> UUID: {new_user_id[:8]}...)")
+                    mappings['users'][user[col['id']]] = new_user_id
+                    print(f"  ✓ Migrated user: {user[col['username']]} (ID: {user[col['id']]} -> UUID: {new_user_id[:8]}...)")
                     print(f"    Email: {email} ({email_source}), Temp Password: {temp_password}")
                 else:
                     # Rollback: delete auth user
                     try:
+                        throttle()
                         supabase.auth.admin.delete_user(new_user_id)
                     except:
                         pass
-                    print(f"  ✗ Failed to create user record for {user['username']}")
+                    print(f"  ✗ Failed to create user record for {user[col['username']]}")
                     
             except Exception as e:
-                print(f"  ✗ Error creating auth user for {user['username']}: {str(e)}")
+                if getattr(e, 'code', None) == 'email_exists' or 'already been registered' in str(e):
+                    # Registered after the pre-pass listed Auth users, e.g. by another
+                    # source of the same batch run sharing this address
+                    email_conflicts[user[col['username']]] = email
+                print(f"  ✗ Error creating auth user for {user[col['username']]}: {str(e)}")
                 continue
                 
         except Exception as e:
-            print(f"  ✗ Error migrating user {user.get('username', 'Unknown')}: {str(e)}")
+            print(f"  ✗ Error migrating user {user[col['username']]}: {str(e)}")
             continue
     
     # Save temporary passwords to file
-    with open('temp_passwords.json', 'w') as f:
+    with open(output_dir / 'temp_passwords.json', 'w') as f:
         json.dump(temp_passwords, f, indent=2)
-    print(f"\n⚠ Temporary passwords saved to temp_passwords.json")
+    print(f"\n⚠ Temporary passwords saved to {output_dir / 'temp_passwords.json'}")
     print("   Share these with users or ask them to reset passwords.")
     
+    if skipped_users:
+        print(f"\n⚠ Skipped {len(skipped_users)} users whose email already belongs to an Auth account:")
+        for username, reason in skipped_users.items():
+            print(f"    {username}: {reason}")
+    
     print(f"\n✓ Completed: {len(mappings['users'])} users migrated")
     return mappings['users']
 
@@ -454,7 +908,7 @@ def migrate_fee_records(school_id_mapping, student_id_mapping):
     print("STEP 7: Migrating Fee Records...")
     print("="*50)
     
-    mysql_cursor.execute("""
+    col, records = fetch_rows("""
         SELECT id, school_id, student_id, month, year, academic_year,
                fee_components, total_amount, late_fee, discount,
                paid, paid_on, payment_mode, notes, created_at, updated_at
@@ -462,52 +916,58 @@ def migrate_fee_records(school_id_mapping, student_id_mapping):
         ORDER BY id
     """)
     
-    records = mysql_cursor.fetchall()
     print(f"Found {len(records)} fee records to migrate")
     
     count = 0
-    for record in records:
-        try:
-            new_school_id = school_id_mapping.get(record['school_id'])
-            new_student_id = student_id_mapping.get(record['student_id'])
-            
-            if not new_school_id or not new_student_id:
-                continue
-            
-            # Handle JSON field
-            fee_components = {}
-            if record['fee_components']:
-                try:
-                    if isinstance(record['fee_components'], str):
-                        fee_components = json.loads(record['fee_components'])
-                    else:
-                        fee_components = record['fee_components']
-                except:
-                    fee_components = {}
-            
-            fee_data = {
-                'school_id': new_school_id,
-                'student_id': new_student_id,
-                'month': record['month'],
-                'year': record['year'],
-                'academic_year': record['academic_year'],
-                'fee_components': fee_components,
-                'total_amount': str(record['total_amount']) if record['total_amount'] else None,
-                'late_fee': str(record['late_fee']) if record['late_fee'] else '0',
-                'discount': str(record['discount']) if record['discount'] else '0',
-                'paid': bool(record['paid']) if record['paid'] is not None else False,
-                'paid_on': record['paid_on'].isoformat() if record['paid_on'] else None,
-                'payment_mode': record['payment_mode'] if record['payment_mode'] else '',
-                'notes': record['notes'] if record['notes'] else '',
-                'created_at': record['created_at'].isoformat() if record['created_at'] else None,
-                'updated_at': record['updated_at'].isoformat() if record['updated_at'] else None,
-            }
-            
-            result = supabase.table('fee_records').insert(fee_data).execute()
-            if result.data:
-                count += 1
-        except Exception as e:
-            print(f"  ✗ Error migrating fee record {record.get('id')}: {str(e)}")
+    
+    def rows_to_insert():
+        for record in records:
+            try:
+                new_school_id = school_id_mapping.get(record[col['school_id']])
+                new_student_id = student_id_mapping.get(record[col['student_id']])
+                
+                if not new_school_id or not new_student_id:
+                    continue
+                
+                # Handle JSON field
+                fee_components = {}
+                if record[col['fee_components']]:
+                    try:
+                        if isinstance(record[col['fee_components']], str):
+                            fee_components = json.loads(record[col['fee_components']])
+                        else:
+                            fee_components = record[col['fee_components']]
+                    except:
+                        fee_components = {}
+                
+                fee_data = {
+                    'migration_key': migration_key(record[col['id']]),
+                    'school_id': new_school_id,
+                    'student_id': new_student_id,
+                    'month': record[col['month']],
+                    'year': record[col['year']],
+                    'academic_year': record[col['academic_year']],
+                    'fee_components': fee_components,
+                    'total_amount': str(record[col['total_amount']]) if record[col['total_amount']] else None,
+                    'late_fee': str(record[col['late_fee']]) if record[col['late_fee']] else '0',
+                    'discount': str(record[col['discount']]) if record[col['discount']] else '0',
+                    'paid': bool(record[col['paid']]) if record[col['paid']] is not None else False,
+                    'paid_on': record[col['paid_on']].isoformat() if record[col['paid_on']] else None,
+                    'payment_mode': record[col['payment_mode']] if record[col['payment_mode']] else '',
+                    'notes': record[col['notes']] if record[col['notes']] else '',
+                    'created_at': record[col['created_at']].isoformat() if record[col['created_at']] else None,
+                    'updated_at': record[col['updated_at']].isoformat() if record[col['updated_at']] else None,
+                }
+                
+                yield record, fee_data
+            except Exception as e:
+                print(f"  ✗ Error migrating fee record {record[col['id']]}: {str(e)}")
+    
+    for record, inserted, error in insert_rows('fee_records', rows_to_insert()):
+        if error:
+            print(f"  ✗ Error migrating fee record {record[col['id']]}: {str(error)}")
+        elif inserted:
+            count += 1
     
     print(f"\n✓ Completed: {count} fee records migrated")
     return count
@@ -518,7 +978,7 @@ def migrate_salary_records(school_id_mapping, staff_id_mapping):
     print("STEP 8: Migrating Salary Records...")
     print("="*50)
     
-    mysql_cursor.execute("""
+    col, records = fetch_rows("""
         SELECT id, school_id, staff_id, month, year,
                base_salary, allowances, deductions, bonuses, net_salary,
                paid, paid_on, payment_mode, notes, created_at, updated_at
@@ -526,62 +986,68 @@ def migrate_salary_records(school_id_mapping, staff_id_mapping):
         ORDER BY id
     """)
     
-    records = mysql_cursor.fetchall()
     print(f"Found {len(records)} salary records to migrate")
     
     count = 0
-    for record in records:
-        try:
-            new_school_id = school_id_mapping.get(record['school_id'])
-            new_staff_id = staff_id_mapping.get(record['staff_id'])
-            
-            if not new_school_id or not new_staff_id:
-                continue
-            
-            # Handle JSON fields
-            allowances = {}
-            deductions = {}
-            if record['allowances']:
-                try:
-                    if isinstance(record['allowances'], str):
-                        allowances = json.loads(record['allowances'])
-                    else:
-                        allowances = record['allowances']
-                except:
-                    allowances = {}
-            
-            if record['deductions']:
-                try:
-                    if isinstance(record['deductions'], str):
-                        deductions = json.loads(record['deductions'])
-                    else:
-                        deductions = record['deductions']
-                except:
-                    deductions = {}
-            
-            salary_data = {
-                'school_id': new_school_id,
-                'staff_id': new_staff_id,
-                'month': record['month'],
-                'year': record['year'],
-                'base_salary': str(record['base_salary']) if record['base_salary'] else None,
-                'allowances': allowances,
-                'deductions': deductions,
-                'bonuses': str(record['bonuses']) if record['bonuses'] else '0',
-                'net_salary': str(record['net_salary']) if record['net_salary'] else None,
-                'paid': bool(record['paid']) if record['paid'] is not None else False,
-                'paid_on': record['paid_on'].isoformat() if record['paid_on'] else None,
-                'payment_mode': record['payment_mode'] if record['payment_mode'] else '',
-                'notes': record['notes'] if record['notes'] else '',
-                'created_at': record['created_at'].isoformat() if record['created_at'] else None,
-                'updated_at': record['updated_at'].isoformat() if record['updated_at'] else None,
-            }
-            
-            result = supabase.table('salary_records').insert(salary_data).execute()
-            if result.data:
-                count += 1
-        except Exception as e:
-            print(f"  ✗ Error migrating salary record {record.get('id')}: {str(e)}")
+    
+    def rows_to_insert():
+        for record in records:
+            try:
+                new_school_id = school_id_mapping.get(record[col['school_id']])
+                new_staff_id = staff_id_mapping.get(record[col['staff_id']])
+                
+                if not new_school_id or not new_staff_id:
+                    continue
+                
+                # Handle JSON fields
+                allowances = {}
+                deductions = {}
+                if record[col['allowances']]:
+                    try:
+                        if isinstance(record[col['allowances']], str):
+                            allowances = json.loads(record[col['allowances']])
+                        else:
+                            allowances = record[col['allowances']]
+                    except:
+                        allowances = {}
+                
+                if record[col['deductions']]:
+                    try:
+                        if isinstance(record[col['deductions']], str):
+                            deductions = json.loads(record[col['deductions']])
+                        else:
+                            deductions = record[col['deductions']]
+                    except:
+                        deductions = {}
+                
+                salary_data = {
+                    'migration_key': migration_key(record[col['id']]),
+                    'school_id': new_school_id,
+                    'staff_id': new_staff_id,
+                    'month': record[col['month']],
+                    'year': record[col['year']],
+                    'base_salary': str(record[col['base_salary']]) if record[col['base_salary']] else None,
+                    'allowances': allowances,
+                    'deductions': deductions,
+                    'bonuses': str(record[col['bonuses']]) if record[col['bonuses']] else '0',
+                    'net_salary': str(record[col['net_salary']]) if record[col['net_salary']] else None,
+                    'paid': bool(record[col['paid']]) if record[col['paid']] is not None else False,
+                    'paid_on': record[col['paid_on']].isoformat() if record[col['paid_on']] else None,
+                    'payment_mode': record[col['payment_mode']] if record[col['payment_mode']] else '',
+                    'notes': record[col['notes']] if record[col['notes']] else '',
+                    'created_at': record[col['created_at']].isoformat() if record[col['created_at']] else None,
+                    'updated_at': record[col['updated_at']].isoformat() if record[col['updated_at']] else None,
+                }
+                
+                yield record, salary_data
+            except Exception as e:
+                print(f"  ✗ Error migrating salary record {record[col['id']]}: {str(e)}")
+    
+    for record, inserted, error in insert_rows('salary_records', rows_to_insert()):
+        if error:
+            print(f"  ✗ Error migrating salary record {record[col['id']]}: {str(error)}")
+        elif inserted:
+            count += 1
     
     print(f"\n✓ Completed: {count} salary records migrated")
     return count
@@ -592,43 +1058,49 @@ def migrate_attendance(school_id_mapping, staff_id_mapping, student_id_mapping):
     print("STEP 9: Migrating Attendance Records...")
     print("="*50)
     
-    mysql_cursor.execute("""
+    col, records = fetch_rows("""
         SELECT id, school_id, staff_id, student_id, date, status,
                hours_worked, notes, created_at, updated_at
         FROM attendance
         ORDER BY id
     """)
     
-    records = mysql_cursor.fetchall()
     print(f"Found {len(records)} attendance records to migrate")
     
     count = 0
-    for record in records:
-        try:
-            new_school_id = school_id_mapping.get(record['school_id'])
-            if not new_school_id:
-                continue
-            
-            new_staff_id = staff_id_mapping.get(record['staff_id']) if record['staff_id'] else None
-            new_student_id = student_id_mapping.get(record['student_id']) if record['student_id'] else None
-            
-            attendance_data = {
-                'school_id': new_school_id,
-                'staff_id': new_staff_id,
-                'student_id': new_student_id,
-                'date': record['date'].isoformat() if record['date'] else None,
-                'status': record['status'],
-                'hours_worked': float(record['hours_worked']) if record['hours_worked'] else None,
-                'notes': record['notes'] if record['notes'] else '',
-                'created_at': record['created_at'].isoformat() if record['created_at'] else None,
-                'updated_at': record['updated_at'].isoformat() if record['updated_at'] else None,
-            }
-            
-            result = supabase.table('attendance').insert(attendance_data).execute()
-            if result.data:
-                count += 1
-        except Exception as e:
-            print(f"  ✗ Error migrating attendance record {record.get('id')}: {str(e)}")
+    
+    def rows_to_insert():
+        for record in records:
+            try:
+                new_school_id = school_id_mapping.get(record[col['school_id']])
+                if not new_school_id:
+                    continue
+                
+                new_staff_id = staff_id_mapping.get(record[col['staff_id']]) if record[col['staff_id']] else None
+                new_student_id = student_id_mapping.get(record[col['student_id']]) if record[col['student_id']] else None
+                
+                attendance_data = {
+                    'migration_key': migration_key(record[col['id']]),
+                    'school_id': new_school_id,
+                    'staff_id': new_staff_id,
+                    'student_id': new_student_id,
+                    'date': record[col['date']].isoformat() if record[col['date']] else None,
+                    'status': record[col['status']],
+                    'hours_worked': float(record[col['hours_worked']]) if record[col['hours_worked']] else None,
+                    'notes': record[col['notes']] if record[col['notes']] else '',
+                    'created_at': record[col['created_at']].isoformat() if record[col['created_at']] else None,
+                    'updated_at': record[col['updated_at']].isoformat() if record[col['updated_at']] else None,
+                }
+                
+                yield record, attendance_data
+            except Exception as e:
+                print(f"  ✗ Error migrating attendance record {record[col['id']]}: {str(e)}")
+    
+    for record, inserted, error in insert_rows('attendance', rows_to_insert()):
+        if error:
+            print(f"  ✗ Error migrating attendance record {record[col['id']]}: {str(error)}")
+        elif inserted:
+            count += 1
     
     print(f"\n✓ Completed: {count} attendance records migrated")
     return count
@@ -639,7 +1111,7 @@ def migrate_visitors(school_id_mapping, guard_id_mapping):
     print("STEP 10: Migrating Visitors...")
     print("="*50)
     
-    mysql_cursor.execute("""
+    col, records = fetch_rows("""
         SELECT id, school_id, guard_id, name, contact_no, purpose,
                id_proof, vehicle_no, date, time_in, time_out, notes,
                created_at, updated_at
@@ -647,44 +1119,134 @@ def migrate_visitors(school_id_mapping, guard_id_mapping):
         ORDER BY id
     """)
     
-    records = mysql_cursor.fetchall()
     print(f"Found {len(records)} visitor records to migrate")
     
     count = 0
-    for record in records:
-        try:
-            new_school_id = school_id_mapping.get(record['school_id'])
-            if not new_school_id:
-                continue
-            
-            new_guard_id = guard_id_mapping.get(record['guard_id']) if record['guard_id'] else None
-            
-            visitor_data = {
-                'school_id': new_school_id,
-                'guard_id': new_guard_id,
-                'name': record['name'],
-                'contact_no': record['contact_no'] if record['contact_no'] else '',
-                'purpose': record['purpose'] if record['purpose'] else '',
-                'id_proof': record['id_proof'] if record['id_proof'] else '',
-                'vehicle_no': record['vehicle_no'] if record['vehicle_no'] else '',
-                'date': record['date'].isoformat() if record['date'] else None,
-                'time_in': str(record['time_in']) if record['time_in'] else None,
-                'time_out': str(record['time_out']) if record['time_out'] else None,
-                'notes': record['notes'] if record['notes'] else '',
-                'created_at': record['created_at'].isoformat() if record['created_at'] else None,
-                'updated_at': record['updated_at'].isoformat() if record['updated_at'] else None,
-            }
-            
-            result = supabase.table('visitor').insert(visitor_data).execute()
-            if result.data:
-                count += 1
-        except Exception as e:
-            print(f"  ✗ Error migrating visitor record {record.get('id')}: {str(e)}")
+    
+    def rows_to_insert():
+        for record in records:
+            try:
+                new_school_id = school_id_mapping.get(record[col['school_id']])
+                if not new_school_id:
+                    continue
+                
+                new_guard_id = guard_id_mapping.get(record[col['guard_id']]) if record[col['guard_id']] else None
+                
+                visitor_data = {
+                    'migration_key': migration_key(record[col['id']]),
+                    'school_id': new_school_id,
+                    'guard_id': new_guard_id,
+                    'name': record[col['name']],
+                    'contact_no': record[col['contact_no']] if record[col['contact_no']] else '',
+                    'purpose': record[col['purpose']] if record[col['purpose']] else '',
+                    'id_proof': record[col['id_proof']] if record[col['id_proof']] else '',
+                    'vehicle_no': record[col['vehicle_no']] if record[col['vehicle_no']] else '',
+                    'date': record[col['date']].isoformat() if record[col['date']] else None,
+                    'time_in': str(record[col['time_in']]) if record[col['time_in']] else None,
+                    'time_out': str(record[col['time_out']]) if record[col['time_out']] else None,
+                    'notes': record[col['notes']] if record[col['notes']] else '',
+                    'created_at': record[col['created_at']].isoformat() if record[col['created_at']] else None,
+                    'updated_at': record[col['updated_at']].isoformat() if record[col['updated_at']] else None,
+                }
+                
+                yield record, visitor_data
+            except Exception as e:
+                print(f"  ✗ Error migrating visitor record {record[col['id']]}: {str(e)}")
+    
+    for record, inserted, error in insert_rows('visitor', rows_to_insert()):
+        if error:
+            print(f"  ✗ Error migrating visitor record {record[col['id']]}: {str(error)}")
+        elif inserted:
+            count += 1
     
     print(f"\n✓ Completed: {count} visitor records migrated")
     return count
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Migrate Django/MySQL data to Supabase")
+    parser.add_argument('--profile', action='store_true',
+                        help="profile each step and write pstats, collapsed stacks and a summary")
+    parser.add_argument('--profile-dir', default='migration_profiles',
+                        help="where --profile writes its files (default: migration_profiles)")
+    parser.add_argument('--profile-mode', choices=('sample', 'deterministic'), default='sample',
+                        help="'sample' (default, low overhead) or 'deterministic' (cProfile, exact call counts)")
+    parser.add_argument('--no-gzip', action='store_true',
+                        help="never gzip-compress request bodies")
+    return parser.parse_args()
+
+def run_migration(target_dir='.'):
+    """Run every migration step and return the migrated counts per table
+
+    Mappings and temporary passwords are written to target_dir.
+    """
+    global output_dir
+    output_dir = Path(target_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    
+    # Step 1: Migrate schools
+    school_id_mapping = run_step('schools', migrate_schools)
+    
+    # Step 2: Migrate classrooms
+    classroom_id_mapping = run_step('classrooms', migrate_classrooms, school_id_mapping)
+    
+    # Step 3: Migrate students
+    student_id_mapping = run_step('students', migrate_students, school_id_mapping, classroom_id_mapping)
+    
+    # Step 4: Migrate staff
+    staff_id_mapping = run_step('staff', migrate_staff, school_id_mapping)
+    
+    # Step 5: Migrate guards
+    guard_id_mapping = run_step('guards', migrate_guards, school_id_mapping)
+    
+    # Step 6: Migrate users (creates auth accounts)
+    user_id_mapping = run_step('users', migrate_users, school_id_mapping, staff_id_mapping, student_id_mapping, guard_id_mapping)
+    
+    # Step 7: Migrate fee records
+    fee_count = run_step('fee_records', migrate_fee_records, school_id_mapping, student_id_mapping)
+    
+    # Step 8: Migrate salary records
+    salary_count = run_step('salary_records', migrate_salary_records, school_id_mapping, staff_id_mapping)
+    
+    # Step 9: Migrate attendance
+    attendance_count = run_step('attendance', migrate_attendance, school_id_mapping, staff_id_mapping, student_id_mapping)
+    
+    # Step 10: Migrate visitors
+    visitor_count = run_step('visitors', migrate_visitors, school_id_mapping, guard_id_mapping)
+    
+    # Save mappings for reference
+    mappings['classrooms'] = classroom_id_mapping
+    mappings['guards'] = guard_id_mapping
+    
+    with open(output_dir / 'migration_mappings.json', 'w') as f:
+        json.dump(mappings, f, indent=2)
+    
+    return {
+        'schools': len(school_id_mapping),
+        'classrooms': len(classroom_id_mapping),
+        'students': len(student_id_mapping),
+        'staff': len(staff_id_mapping),
+        'guards': len(guard_id_mapping),
+        'users': len(user_id_mapping),
+        'users_skipped': len(skipped_users),
+        'email_conflicts': len(email_conflicts),
+        'fee_records': fee_count,
+        'salary_records': salary_count,
+        'attendance': attendance_count,
+        'visitors': visitor_count,
+    }
+
 def main():
+    global profiler, gzip_requests
+    args = parse_args()
+    if args.no_gzip:
+        gzip_requests = False
+    if args.profile:
+        from migration_profiler import StepProfiler
+        profiler = StepProfiler(args.profile_dir, __file__, args.profile_mode)
+    
+    if not connect():
+        exit(1)
+    
     print("\n" + "="*60)
     print("DJANGO TO SUPABASE DATA MIGRATION")
     print("="*60)
@@ -696,56 +1258,25 @@ def main():
     print("\nStarting migration...\n")
     
     try:
-        # Step 1: Migrate schools
-        school_id_mapping = migrate_schools()
-        
-        # Step 2: Migrate classrooms
-        classroom_id_mapping = migrate_classrooms(school_id_mapping)
-        
-        # Step 3: Migrate students
-        student_id_mapping = migrate_students(school_id_mapping, classroom_id_mapping)
-        
-        # Step 4: Migrate staff
-        staff_id_mapping = migrate_staff(school_id_mapping)
-        
-        # Step 5: Migrate guards
-        guard_id_mapping = migrate_guards(school_id_mapping)
-        
-        # Step 6: Migrate users (creates auth accounts)
-        user_id_mapping = migrate_users(school_id_mapping, staff_id_mapping, student_id_mapping, guard_id_mapping)
-        
-        # Step 7: Migrate fee records
-        fee_count = migrate_fee_records(school_id_mapping, student_id_mapping)
-        
-        # Step 8: Migrate salary records
-        salary_count = migrate_salary_records(school_id_mapping, staff_id_mapping)
-        
-        # Step 9: Migrate attendance
-        attendance_count = migrate_attendance(school_id_mapping, staff_id_mapping, student_id_mapping)
-        
-        # Step 10: Migrate visitors
-        visitor_count = migrate_visitors(school_id_mapping, guard_id_mapping)
-        
-        # Save mappings for reference
-        mappings['classrooms'] = classroom_id_mapping
-        mappings['guards'] = guard_id_mapping
-        
-        with open('migration_mappings.json', 'w') as f:
-            json.dump(mappings, f, indent=2)
+        counts = run_migration()
         
         print("\n" + "="*60)
         print("MIGRATION SUMMARY")
         print("="*60)
-        print(f"✓ Schools: {len(school_id_mapping)}")
-        print(f"✓ Classrooms: {len(classroom_id_mapping)}")
-        print(f"✓ Students: {len(student_id_mapping)}")
-        print(f"✓ Staff: {len(staff_id_mapping)}")
-        print(f"✓ Guards: {len(guard_id_mapping)}")
-        print(f"✓ Users: {len(user_id_mapping)}")
-        print(f"✓ Fee Records: {fee_count}")
-        print(f"✓ Salary Records: {salary_count}")
-        print(f"✓ Attendance Records: {attendance_count}")
-        print(f"✓ Visitor Records: {visitor_count}")
+        print(f"✓ Schools: {counts['schools']}")
+        print(f"✓ Classrooms: {counts['classrooms']}")
+        print(f"✓ Students: {counts['students']}")
+        print(f"✓ Staff: {counts['staff']}")
+        print(f"✓ Guards: {counts['guards']}")
+        print(f"✓ Users: {counts['users']}")
+        if counts['users_skipped']:
+            print(f"⚠ Users skipped (email already in Auth): {counts['users_skipped']}")
+        if counts['email_conflicts']:
+            print(f"⚠ Users not created (email registered during the run): {counts['email_conflicts']}")
+        print(f"✓ Fee Records: {counts['fee_records']}")
+        print(f"✓ Salary Records: {counts['salary_records']}")
+        print(f"✓ Attendance Records: {counts['attendance']}")
+        print(f"✓ Visitor Records: {counts['visitors']}")
         print("\n✓ Mappings saved to: migration_mappings.json")
         print("✓ Temporary passwords saved to: temp_passwords.json")
         print("\n⚠ IMPORTANT NEXT STEPS:")
@@ -759,8 +1290,13 @@ def main():
         import traceback
         traceback.print_exc()
     finally:
-        mysql_conn.close()
-        print("\n✓ Database connections closed")
+        if profiler is not None and profiler.steps:
+            print("\n" + "="*60)
+            print("PROFILE SUMMARY")
+            print("="*60)
+            print(profiler.write_summary())
+            print(f"✓ Per-step .pstats and .collapsed files saved to: {profiler.output_dir}/")
+        close()
 
 if __name__ == '__main__':
     main()
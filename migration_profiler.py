@@ -0,0 +1,194 @@
+"""
+Profiling support for migrate_to_supabase.py --profile
+
+A background thread samples each migration step's stack. The samples give
+the flame-graph collapsed stacks, the wall-clock breakdown by component,
+and (in the default 'sample' mode) a pstats file built from the samples.
+In 'deterministic' mode cProfile writes the pstats file instead, with
+exact call counts, but its per-call overhead inflates Python-heavy code
+in the sampled breakdown. Nothing here is imported or started unless
+--profile is given.
+"""
+
+import cProfile
+import io
+import linecache
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+# Components reported in the summary, matched against frame file paths.
+# A sample is charged to the first component found walking from the leaf
+# frame up, so e.g. socket reads under httpx count as supabase/httpx.
+COMPONENTS = [
+    ('json', (f'{os.sep}json{os.sep}',)),
+    ('mysql.connector', (f'{os.sep}mysql{os.sep}', '_mysql_connector')),
+    ('supabase/httpx', tuple(f'{os.sep}{name}{os.sep}' for name in (
+        'supabase', 'postgrest', 'gotrue', 'storage3', 'httpx', 'httpcore', 'h11', 'h2', 'anyio'))),
+]
+TRANSFORM = 'transform (migrate_to_supabase)'
+SLEEP = 'sleep (backoff, throttle)'
+OTHER = 'other'
+
+# time.sleep has no Python frame; a sample whose leaf line calls sleep() gets
+# this pseudo-frame as its leaf, named the way cProfile names built-ins
+SLEEP_FRAME = ('~', 0, '<built-in method time.sleep>')
+
+DETERMINISTIC_NOTE = (
+    "  Note: cProfile was active while sampling; its per-call overhead inflates\n"
+    "  transform, JSON and mysql.connector relative to network I/O above.\n"
+)
+
+TOP_FUNCTIONS = 10
+
+def _frame_label(key):
+    """Short 'package/module.py:function' label for a (file, line, function) key"""
+    filename, _, function = key
+    return f"{'/'.join(Path(filename).parts[-2:])}:{function}"
+
+def _component(stack, script_name):
+    """Charge a sampled stack (root first) to sleep or one of COMPONENTS"""
+    if stack[-1] == SLEEP_FRAME:
+        return SLEEP
+    for filename, _, _ in reversed(stack):
+        for name, markers in COMPONENTS:
+            if any(marker in filename for marker in markers):
+                return name
+        if filename.endswith(script_name):
+            return TRANSFORM
+    return OTHER
+
+def _sampled_stats(stacks, seconds_per_sample):
+    """pstats-format stats from sampled stacks; call counts are sample counts"""
+    stats = {}
+    for stack, count in stacks.items():
+        seconds = count * seconds_per_sample
+        seen = set()
+        for depth, key in enumerate(stack):
+            entry = stats.setdefault(key, [0, 0, 0.0, 0.0, {}])
+            is_leaf = depth == len(stack) - 1
+            entry[1] += count
+            if key not in seen:
+                seen.add(key)
+                entry[0] += count
+                entry[3] += seconds
+            if is_leaf:
+                entry[2] += seconds
+            if depth:
+                caller = entry[4].setdefault(stack[depth - 1], [0, 0, 0.0, 0.0])
+                caller[0] += count
+                caller[1] += count
+                caller[3] += seconds
+                if is_leaf:
+                    caller[2] += seconds
+    return {
+        key: (cc, nc, tt, ct, {caller: tuple(values) for caller, values in callers.items()})
+        for key, (cc, nc, tt, ct, callers) in stats.items()
+    }
+
+class StepProfiler:
+    """Profiles migration steps and writes per-step profile files"""
+
+    def __init__(self, output_dir, script_file, mode='sample', interval=0.005):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.script_name = os.path.basename(script_file)
+        self.mode = mode
+        self.interval = interval
+        self.steps = []
+
+    def run(self, name, func, *args):
+        """Run func(*args) as step `name` under the profiler and return its result"""
+        index = len(self.steps) + 1
+        stem = self.output_dir / f"{index:02d}_{name}"
+        stacks = Counter()
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=self._sample,
+            args=(threading.get_ident(), stacks, stop),
+            daemon=True,
+        )
+        profile = cProfile.Profile() if self.mode == 'deterministic' else None
+
+        start = time.perf_counter()
+        sampler.start()
+        if profile:
+            profile.enable()
+        try:
+            return func(*args)
+        finally:
+            if profile:
+                profile.disable()
+            stop.set()
+            sampler.join()
+            elapsed = time.perf_counter() - start
+
+            if profile:
+                profile.create_stats()
+                stats = profile.stats
+            else:
+                # Samples land further apart than the interval under GIL contention,
+                # so spread the measured wall time over them instead
+                stats = _sampled_stats(stacks, elapsed / max(1, sum(stacks.values())))
+            with open(f"{stem}.pstats", 'wb') as f:
+                marshal.dump(stats, f)
+            with open(f"{stem}.collapsed", 'w') as f:
+                for stack, count in stacks.most_common():
+                    f.write(f"{';'.join(_frame_label(key) for key in stack)} {count}\n")
+
+            components = Counter()
+            for stack, count in stacks.items():
+                components[_component(stack, self.script_name)] += count
+            self.steps.append({
+                'name': name,
+                'elapsed': elapsed,
+                'components': components,
+                'stats': stats,
+            })
+
+    def _sample(self, thread_id, stacks, stop):
+        # Only frames below run() are kept: the step function and what it calls,
+        # not <module>, main() and the other wrappers that every sample shares
+        run_code = StepProfiler.run.__code__
+        while not stop.wait(self.interval):
+            leaf = frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None and frame.f_code is not run_code:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if frame is None or not stack:
+                continue
+            if 'sleep(' in linecache.getline(leaf.f_code.co_filename, leaf.f_lineno):
+                stack.insert(0, SLEEP_FRAME)
+            stacks[tuple(reversed(stack))] += 1
+
+    def summary(self):
+        """Text summary: time per component and top functions by cumulative time per step"""
+        calls = 'calls' if self.mode == 'deterministic' else 'samples'
+        out = io.StringIO()
+        out.write(f"Profile mode: {self.mode}\n")
+        for step in self.steps:
+            out.write(f"\n{step['name']}: {step['elapsed']:.2f}s wall\n")
+            total = sum(step['components'].values())
+            for component, count in step['components'].most_common():
+                out.write(f"    {component:<34}{count / total:>6.1%}  ~{step['elapsed'] * count / total:.2f}s\n")
+            if self.mode == 'deterministic':
+                out.write(DETERMINISTIC_NOTE)
+
+            out.write(f"  Top {TOP_FUNCTIONS} functions by cumulative time:\n")
+            top = sorted(step['stats'].items(), key=lambda item: item[1][3], reverse=True)[:TOP_FUNCTIONS]
+            for (filename, line, function), (_, ncalls, _, cumtime, _) in top:
+                location = f"{Path(filename).name}:{line}" if line else filename
+                out.write(f"    {cumtime:>9.3f}s {ncalls:>10} {calls:<7}  {function} ({location})\n")
+        return out.getvalue()
+
+    def write_summary(self):
+        """Write summary.txt next to the per-step files and return its text"""
+        text = self.summary()
+        (self.output_dir / 'summary.txt').write_text(text)
+        return text
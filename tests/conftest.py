@@ -0,0 +1,30 @@
+"""
+Make migrate_to_supabase importable without its client libraries.
+
+The script imports mysql.connector, supabase, httpx and dotenv at module
+level; any that aren't installed are replaced with minimal stand-ins. The
+tests swap in stub clients, so nothing here talks to a real service.
+"""
+
+import sys
+import types
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+for name in ('mysql', 'mysql.connector', 'supabase', 'httpx', 'dotenv'):
+    try:
+        __import__(name)
+    except ImportError:
+        sys.modules[name] = types.ModuleType(name)
+
+sys.modules['mysql'].connector = sys.modules['mysql.connector']
+sys.modules['supabase'].__dict__.setdefault('create_client', None)
+sys.modules['supabase'].__dict__.setdefault('Client', object)
+sys.modules['dotenv'].__dict__.setdefault('load_dotenv', lambda: None)
+
+_httpx = sys.modules['httpx']
+if not hasattr(_httpx, 'HTTPError'):
+    _httpx.HTTPError = type('HTTPError', (Exception,), {})
+    _httpx.TransportError = type('TransportError', (_httpx.HTTPError,), {})
+    _httpx.ReadTimeout = type('ReadTimeout', (_httpx.TransportError,), {})
@@ -0,0 +1,157 @@
+"""
+insert_rows() against a fake PostgREST endpoint that upserts on migration_key.
+"""
+
+import gzip
+import json
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+import migrate_to_supabase as migration
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+        self.text = json.dumps(body)
+
+    @property
+    def is_success(self):
+        return 200 <= self.status_code < 300
+
+    def json(self):
+        return self.body
+
+class FakePostgrest:
+    """Stores rows by migration_key; hooks let a test inject failures"""
+
+    def __init__(self, accepts_gzip=True):
+        self.accepts_gzip = accepts_gzip
+        self.rows = {}
+        self.requests = 0
+        self.probes = 0
+        self.before_commit = None   # (rows) -> FakeResponse or None
+        self.after_commit = None    # (rows) -> exception to raise or None
+
+    def post(self, path, content, headers, params=None):
+        self.requests += 1
+        self.path = path
+        if headers.get('Content-Encoding') == 'gzip':
+            if not self.accepts_gzip:
+                return FakeResponse(400, {'code': 'PGRST102', 'message': 'Empty or invalid json'})
+            content = gzip.decompress(content)
+        rows = json.loads(content)
+        if params is None:
+            self.probes += 1
+            return FakeResponse(201, [])
+        if self.before_commit:
+            rejected = self.before_commit(rows)
+            if rejected:
+                return rejected
+        for row in rows:
+            stored = self.rows.setdefault(row['migration_key'], {'id': len(self.rows) + 1})
+            stored.update(row)
+        if self.after_commit:
+            error = self.after_commit(rows)
+            if error:
+                raise error
+        # Deliberately not in input order
+        return FakeResponse(201, [
+            {'id': self.rows[row['migration_key']]['id'], 'migration_key': row['migration_key']}
+            for row in reversed(rows)
+        ])
+
+@pytest.fixture
+def postgrest(monkeypatch):
+    fake = FakePostgrest()
+    monkeypatch.setattr(migration, 'supabase', SimpleNamespace(postgrest=SimpleNamespace(session=fake)))
+    monkeypatch.setattr(migration, 'batch_stats', {})
+    monkeypatch.setattr(migration, 'gzip_requests', None)
+    monkeypatch.setattr(migration.time, 'sleep', lambda seconds: None)
+    return fake
+
+def items(count, pad=''):
+    return ((i, {'migration_key': str(i), 'n': i, 'pad': pad}) for i in range(count))
+
+def test_rows_are_matched_back_by_migration_key(postgrest):
+    results = list(migration.insert_rows('attendance', items(120)))
+
+    assert [key for key, _, _ in results] == list(range(120))
+    assert all(row['migration_key'] == str(key) for key, row, _ in results)
+
+def test_retry_after_committed_timeout_does_not_duplicate(postgrest):
+    failures = iter([httpx.ReadTimeout('read timed out')])
+    postgrest.after_commit = lambda rows: next(failures, None)
+
+    results = list(migration.insert_rows('attendance', items(30)))
+
+    assert len(postgrest.rows) == 30
+    assert all(error is None for _, _, error in results)
+    assert len({row['id'] for _, row, _ in results}) == 30
+
+def test_bad_row_is_isolated(postgrest):
+    def reject_row_7(rows):
+        if any(row['n'] == 7 for row in rows):
+            return FakeResponse(409, {'code': '23505', 'message': 'duplicate key'})
+    postgrest.before_commit = reject_row_7
+
+    results = list(migration.insert_rows('attendance', items(50)))
+
+    assert [key for key, _, error in results if error] == [7]
+    assert len(postgrest.rows) == 49
+
+def test_auth_error_aborts_table_after_one_request(postgrest):
+    postgrest.before_commit = lambda rows: FakeResponse(401, {'code': '42501', 'message': 'permission denied'})
+
+    assert list(migration.insert_rows('attendance', items(200))) == []
+    assert postgrest.requests == 1
+
+def test_every_row_rejected_aborts_table_early(postgrest):
+    postgrest.before_commit = lambda rows: FakeResponse(409, {'code': '23503', 'message': 'foreign key violation'})
+
+    results = list(migration.insert_rows('attendance', items(200)))
+
+    assert len(results) < migration.BATCH_ABORT_REJECTIONS
+    assert postgrest.requests < 2 * migration.BATCH_ABORT_REJECTIONS + 10
+
+def test_rejected_gzip_probe_turns_compression_off(postgrest):
+    postgrest.accepts_gzip = False
+
+    results = list(migration.insert_rows('students', items(200, pad='x' * 500)))
+
+    # The rejected probe is the only gzip request; every batch goes out plain, once
+    assert migration.gzip_requests is False
+    assert all(error is None for _, _, error in results)
+    assert postgrest.requests == 1 + migration.batch_stats['students']['requests']
+
+def test_gzip_probe_runs_once_when_accepted(postgrest):
+    list(migration.insert_rows('students', items(200, pad='x' * 500)))
+    list(migration.insert_rows('staff', items(200, pad='x' * 500)))
+
+    assert postgrest.probes == 1
+    assert migration.gzip_requests is True
+
+def test_missing_migration_key_is_reported_per_table(postgrest, monkeypatch):
+    class Query:
+        def __init__(self, table):
+            self.table = table
+        def select(self, columns):
+            return self
+        def limit(self, count):
+            return self
+        def execute(self):
+            if self.table == 'guard':
+                raise Exception("column guard.migration_key does not exist")
+
+    def no_unique_on_visitor(rows):
+        if postgrest.path == '/visitor':
+            return FakeResponse(400, {'code': '42P10', 'message': 'no unique or exclusion constraint'})
+    postgrest.before_commit = no_unique_on_visitor
+    monkeypatch.setattr(migration.supabase, 'table', Query, raising=False)
+
+    problems = dict(migration.check_migration_keys())
+
+    assert sorted(problems) == ['guard', 'visitor']
+    assert '42P10' in problems['visitor']
@@ -0,0 +1,25 @@
+"""
+Manifest checks in migrate_batch.py; no jobs are started.
+"""
+
+import json
+
+import pytest
+
+import migrate_batch
+
+def write_manifest(tmp_path, names):
+    path = tmp_path / 'tenants.json'
+    path.write_text(json.dumps({'sources': [{'name': name, 'dump': f'{i}.sql'} for i, name in enumerate(names)]}))
+    return path
+
+def test_names_are_limited_to_one_to_one_characters(tmp_path):
+    for name in ('School A', 'school_a', 'School-A'):
+        with pytest.raises(ValueError, match='lowercase'):
+            migrate_batch.load_manifest(write_manifest(tmp_path, ['school-b', name]))
+
+def test_distinct_names_get_distinct_staging_databases(tmp_path):
+    manifest = migrate_batch.load_manifest(write_manifest(tmp_path, ['school-a', 'schoola', 'school-a-1']))
+
+    databases = {migrate_batch.staging_database_name(source['name']) for source in manifest['sources']}
+    assert len(databases) == 3
@@ -0,0 +1,146 @@
+"""
+Stubbed-cursor check for migrate_users, the only step that runs two queries.
+The MySQL and Supabase clients are replaced with in-memory stubs.
+"""
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import migrate_to_supabase as migration
+
+USER_COLUMNS = ('id', 'username', 'password', 'email', 'first_name', 'last_name',
+                'is_superuser', 'is_active', 'date_joined', 'last_login',
+                'school_id', 'role', 'linked_staff_id', 'linked_student_id', 'linked_guard_id')
+
+class StubCursor:
+    """Answers the schools-email and users queries like the plain tuple cursor"""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.description = None
+        self.pending = None
+
+    def execute(self, query):
+        assert self.pending is None, "previous result was never fetched"
+        table = 'users' if 'FROM users' in query else 'schools'
+        columns, rows = self.tables[table]
+        self.description = [(column,) for column in columns]
+        self.pending = rows
+
+    def fetchall(self):
+        rows, self.pending = self.pending, None
+        return rows
+
+class StubSupabase:
+    def __init__(self):
+        self.created = []
+        self.inserted = []
+        self.registered_elsewhere = set()
+        self.auth = SimpleNamespace(admin=SimpleNamespace(
+            list_users=lambda page, per_page: [],
+            create_user=self._create_user,
+            delete_user=lambda user_id: None,
+        ))
+
+    def _create_user(self, attributes):
+        if attributes['email'] in self.registered_elsewhere:
+            raise Exception("A user with this email address has already been registered")
+        self.created.append(attributes['email'])
+        return SimpleNamespace(user=SimpleNamespace(id=f"uuid-{len(self.created):04d}"))
+
+    def table(self, name):
+        stub = self
+
+        class Query:
+            def insert(self, data):
+                stub.inserted.append(data)
+                return self
+
+            def execute(self):
+                return SimpleNamespace(data=[stub.inserted[-1]])
+
+        return Query()
+
+def user_row(user_id, username, email, role, school_id):
+    values = dict(id=user_id, username=username, password='x', email=email, first_name='', last_name='',
+                  is_superuser=0, is_active=1, date_joined=datetime(2024, 1, 1), last_login=None,
+                  school_id=school_id, role=role, linked_staff_id=None, linked_student_id=None,
+                  linked_guard_id=None)
+    return tuple(values[column] for column in USER_COLUMNS)
+
+@pytest.fixture
+def stubbed(monkeypatch, tmp_path):
+    cursor = StubCursor({
+        'schools': (('id', 'email'), [(1, 'office@school.com')]),
+        'users': (USER_COLUMNS, [
+            user_row(1, 'admin', None, 'school_admin', 1),
+            user_row(2, 'admin2', None, 'school_admin', 1),
+            user_row(3, 'teacher', 'teacher@example.com', 'staff', 1),
+        ]),
+    })
+    client = StubSupabase()
+    monkeypatch.setattr(migration, 'mysql_cursor', cursor)
+    monkeypatch.setattr(migration, 'supabase', client)
+    monkeypatch.setattr(migration, 'output_dir', tmp_path)
+    monkeypatch.setitem(migration.mappings, 'users', {})
+    monkeypatch.setattr(migration, 'skipped_users', {})
+    monkeypatch.setattr(migration, 'email_conflicts', {})
+    return client
+
+def test_migrate_users_reads_school_emails_and_users(stubbed):
+    user_mapping = migration.migrate_users({1: 101}, {}, {}, {})
+
+    assert sorted(user_mapping) == [1, 2, 3]
+    # School email goes to the first school_admin; the second falls back to a generated one
+    assert stubbed.created[0] == 'office@school.com'
+    assert stubbed.created[1].startswith('admin2@')
+    assert stubbed.created[2] == 'teacher@example.com'
+    assert [row['school_id'] for row in stubbed.inserted] == [101, 101, 101]
+
+def test_generated_emails_are_namespaced_by_source(monkeypatch):
+    assert migration.generate_email_from_username('admin', 1) == 'admin@school1.local'
+
+    monkeypatch.setattr(migration, 'source_name', 'School A')
+    assert migration.generate_email_from_username('admin', 1) == 'admin@school1.school-a.local'
+    assert migration.generate_email_from_username('admin') == 'admin@migrated.school-a.local'
+
+def resolve(users, existing_emails=None, migrated_keys=None):
+    col = {column: index for index, column in enumerate(USER_COLUMNS)}
+    return migration.resolve_user_emails(col, users, {}, existing_emails or {}, migrated_keys)
+
+def test_deduplicated_email_is_checked_against_taken():
+    existing = {email: f"auth-{i}" for i, email in enumerate(
+        ['bob@school1.local', 'bob+5@school1.local', 'bob+5-2@school1.local'])}
+
+    resolved, _, _ = resolve([user_row(5, 'bob', None, 'staff', 1)], existing)
+
+    assert resolved[5] == ('bob+5-3@school1.local', 'generated, deduplicated')
+
+def test_own_email_in_auth_is_not_given_a_second_account():
+    resolved, collisions, existing = resolve(
+        [user_row(3, 'teacher', 'Teacher@example.com', 'staff', 1)],
+        {'teacher@example.com': 'auth-1'},
+    )
+
+    assert resolved == {} and collisions == []
+    assert existing[3] == ('Teacher@example.com', 'auth-1', False)
+
+def test_rerun_recognises_accounts_it_created():
+    resolved, _, existing = resolve(
+        [user_row(5, 'bob', None, 'staff', 1)],
+        {'bob@school1.local': 'auth-1'},
+        {'5': 'auth-1'},
+    )
+
+    assert resolved == {}
+    assert existing[5] == (None, 'auth-1', True)
+
+def test_email_registered_during_the_run_is_counted(stubbed):
+    stubbed.registered_elsewhere.add('teacher@example.com')
+
+    user_mapping = migration.migrate_users({1: 101}, {}, {}, {})
+
+    assert sorted(user_mapping) == [1, 2]
+    assert migration.email_conflicts == {'teacher': 'teacher@example.com'}